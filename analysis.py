@@ -1,117 +1,198 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import numpy as np
 import pandas as pd
 
+_EASTERN = ZoneInfo("US/Eastern")
+_PRAGUE = ZoneInfo("Europe/Prague")
+
+# OpenTime carries no date and is read as 2000-01-01, so US/Eastern -> CET is
+# a fixed shift that only has to be resolved once
+_REFERENCE_DATE = datetime(2000, 1, 1)
+CET_OFFSET_SECONDS = int(
+    (_REFERENCE_DATE.replace(tzinfo=_PRAGUE).utcoffset()
+     - _REFERENCE_DATE.replace(tzinfo=_EASTERN).utcoffset()).total_seconds()
+)
+SECONDS_PER_DAY = 24 * 3600
+
+# Summary columns holding percentages, formatted only for display
+PERCENT_COLUMNS = ["WinRate", "CAR", "MaxDrawdown"]
+
+def _map_unique(values: pd.Series, func) -> pd.Series:
+    """Applies a vectorized func to the distinct values only and maps the results back onto values."""
+    unique_values = values.drop_duplicates()
+    return values.map(pd.Series(func(unique_values).to_numpy(), index=unique_values.to_numpy()))
+
+def _parse_seconds(open_times: pd.Series) -> pd.Series:
+    """Parses HH:MM:SS OpenTime values into seconds since midnight (NaN if unparseable)."""
+    parsed = pd.to_datetime(open_times, format="%H:%M:%S", errors="coerce")
+    return (parsed - parsed.dt.normalize()).dt.total_seconds()
+
+def _format_seconds(seconds: np.ndarray) -> np.ndarray:
+    """Formats seconds since midnight as HH:MM:SS strings."""
+    return pd.to_datetime(seconds, unit="s").strftime("%H:%M:%S").to_numpy()
+
+def compute_max_drawdowns(codes: np.ndarray, pnls: np.ndarray, starting_capital: float) -> np.ndarray:
+    """
+    Computes the maximum drawdown (in %) of each group's equity curve without a per-group Python loop.
+
+    Rows are stably sorted by group code once, so every group becomes a contiguous
+    segment in its original (chronological) order. The equity curves and running
+    maxima come from a segmented groupby cumsum/cummax, and each segment's worst
+    drawdown from np.fmin.reduceat. NaN PnLs (unparseable rows) are skipped, and a
+    group with only NaN PnLs gets a NaN drawdown.
+
+    Args:
+        codes (np.ndarray): Non-negative integer group code of each trade.
+        pnls (np.ndarray): Float64 array of trade PnLs, aligned with codes.
+        starting_capital (float): Capital each equity curve starts from.
+
+    Returns:
+        np.ndarray: Maximum drawdown per group in percent, rounded to 2 decimals,
+                    ordered by ascending group code.
+    """
+    if codes.size == 0:
+        return np.empty(0, dtype=np.float64)
+
+    order = np.argsort(codes, kind="stable")
+    codes_sorted = codes[order]
+    pnl_sorted = pd.Series(pnls[order])
+    starts = np.r_[0, np.flatnonzero(np.diff(codes_sorted)) + 1]
+
+    # Segmented cumsum/cummax run per group in one Cython pass each, adding up
+    # every segment from its own start so the results match a per-group cumsum exactly.
+    # NaN PnLs (unparseable rows) stay NaN and are skipped, as in the per-group version
+    equity_curve = pnl_sorted.groupby(codes_sorted, sort=False).cumsum() + starting_capital
+    running_max = equity_curve.groupby(codes_sorted, sort=False).cummax()
+    drawdowns = ((equity_curve - running_max) / running_max).to_numpy()
+    return np.round(np.fmin.reduceat(drawdowns, starts) * 100, 2)
+
+def format_summary(summary: pd.DataFrame) -> pd.DataFrame:
+    """
+    Formats a numeric summary for the Excel report.
+
+    Args:
+        summary (pd.DataFrame): Output of summarize_pnl_by_opentime() or analyze_all_weekdays().
+
+    Returns:
+        pd.DataFrame: Copy of summary with percentage columns as 'X.XX%' strings and
+                      undefined values shown as 'N/A'.
+    """
+    display = summary.copy()
+    for col in PERCENT_COLUMNS:
+        if col in display.columns:
+            display[col] = (display[col].astype(str) + "%").where(display[col].notna(), "N/A")
+    if "Calmar" in display.columns:
+        display["Calmar"] = display["Calmar"].astype(object).where(display["Calmar"].notna(), "N/A")
+    return display
+
+def prepare_trades(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Parses a raw BYOB trade export once so it can be shared by all summaries.
+
+    Args:
+        df (pd.DataFrame): Raw DataFrame containing at least columns 'OpenTime', 'ProfitLossAfterSlippage',
+                           'CommissionFees' and 'IsWin' (and 'OpenDate' for CAR and weekday analysis).
+
+    Returns:
+        pd.DataFrame: Shallow copy of df with typed columns plus 'NetPnL', 'OpenTimeSec' and 'WeekdayNum'.
+    """
+    # Only whole columns are replaced below, so a shallow copy keeps the caller's frame intact
+    df = df.copy(deep=False)
+    # Group on integer seconds since midnight; each distinct OpenTime string is parsed once
+    df["OpenTimeSec"] = _map_unique(df["OpenTime"], _parse_seconds).astype("Int32")
+    # Clean exports already arrive as float64/bool from read_csv and are left as they are;
+    # malformed cells leave the column as strings and are coerced to NaN here
+    for col in ("ProfitLossAfterSlippage", "CommissionFees"):
+        if not pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["NetPnL"] = df["ProfitLossAfterSlippage"] * 100 - df["CommissionFees"]
+    # IsWin as int8 (1 = win) so Wins is a plain integer sum; missing values count as losses
+    if pd.api.types.is_bool_dtype(df["IsWin"]):
+        df["IsWin"] = df["IsWin"].fillna(False).astype("int8")
+    else:
+        # Convert IsWin from strings, handling case differences
+        df["IsWin"] = df["IsWin"].astype(str).str.lower().eq("true").astype("int8")
+
+    if "OpenDate" in df.columns:
+        if not pd.api.types.is_datetime64_any_dtype(df["OpenDate"]):
+            df["OpenDate"] = pd.to_datetime(df["OpenDate"], errors="coerce")
+        df["WeekdayNum"] = df["OpenDate"].dt.dayofweek
+
+    return df
+
 def summarize_pnl_by_opentime(df: pd.DataFrame) -> pd.DataFrame:
     """
     Aggregates net PnL (ProfitLossAfterSlippage - CommissionFees) for each unique OpenTime.
 
     Args:
-        df (pd.DataFrame): DataFrame containing at least columns 'OpenTime', 'ProfitLossAfterSlippage', and 'CommissionFees'.
+        df (pd.DataFrame): Trades already parsed by prepare_trades().
 
     Returns:
         pd.DataFrame: Summary DataFrame with 'OpenTime' and total 'NetPnL'.
     """
-    import pytz
+    return _summarize_by(df, ["OpenTimeSec"])
 
-    df = df.copy()
-    # Keep original OpenTime as string for CET conversion
-    df["OpenTime"] = pd.to_datetime(df["OpenTime"], format="%H:%M:%S", errors="coerce").dt.time
-    df["ProfitLossAfterSlippage"] = pd.to_numeric(df["ProfitLossAfterSlippage"], errors="coerce")
-    df["CommissionFees"] = pd.to_numeric(df["CommissionFees"], errors="coerce")
-    df["NetPnL"] = df["ProfitLossAfterSlippage"]*100 - df["CommissionFees"]
-    # Convert IsWin to boolean, handling string cases
-    df["IsWin"] = df["IsWin"].astype(str).str.lower().map({"true": True, "false": False})
+def _summarize_by(df: pd.DataFrame, keys: list) -> pd.DataFrame:
+    """
+    Aggregates prepared trades by keys, which must end with 'OpenTimeSec'.
 
-    # --- CET Conversion ---
-    # Convert OpenTime (HH:MM:SS) to datetime with arbitrary date and convert to CET
-    def convert_to_cet(time_str):
-        try:
-            naive_dt = pd.to_datetime(f"2000-01-01 {time_str}")
-            eastern = pytz.timezone("US/Eastern")
-            cet = pytz.timezone("Europe/Prague")
-            localized = eastern.localize(naive_dt)
-            return localized.astimezone(cet).strftime("%H:%M:%S")
-        except:
-            return None
-    # Create OpenTimeCET column based on original string OpenTime
-    # Need to get the string representation of OpenTime for apply
-    open_time_strs = df["OpenTime"].astype(str)
-    df["OpenTimeCET"] = open_time_strs.apply(convert_to_cet)
-
-    grouped = df.groupby("OpenTime").agg(
+    Any leading keys (e.g. 'WeekdayNum') split the data into independent
+    sub-analyses: CAR counts the trading days within each of them.
+    """
+    # Build the group index once and reuse it for every per-group column
+    gb = df.groupby(keys)
+    grouped = gb.agg(
         NetPnL=("NetPnL", "sum"),
-        Trades=("OpenTime", "count"),
+        Trades=("NetPnL", "size"),
         Wins=("IsWin", "sum"),
-        Losses=("IsWin", lambda x: (~x).sum())
     ).reset_index()
-    grouped["WinRate"] = ((grouped["Wins"] / grouped["Trades"] * 100).round(2)).astype(str) + "%"
 
-    # Add CET column to grouped by merging unique pairs
-    grouped = grouped.merge(
-        df[["OpenTime", "OpenTimeCET"]].drop_duplicates(), on="OpenTime", how="left"
-    )
-    # Reorder columns so OpenTimeCET is next to OpenTime
-    cols = list(grouped.columns)
-    if "OpenTime" in cols and "OpenTimeCET" in cols:
-        cols.insert(cols.index("OpenTime") + 1, cols.pop(cols.index("OpenTimeCET")))
-        grouped = grouped[cols]
+    # --- CET Conversion ---
+    # Swap the integer key for display columns, computed once per group
+    position = grouped.columns.get_loc("OpenTimeSec")
+    seconds = grouped.pop("OpenTimeSec").to_numpy(dtype=np.int64)
+    grouped.insert(position, "OpenTime", pd.to_datetime(seconds, unit="s").time)
+    grouped.insert(position + 1, "OpenTimeCET", _format_seconds((seconds + CET_OFFSET_SECONDS) % SECONDS_PER_DAY))
+
+    grouped["Losses"] = grouped["Trades"] - grouped["Wins"]
+    grouped["WinRate"] = (grouped["Wins"] / grouped["Trades"] * 100).round(2)
 
     # Define starting capital for CAR calculation
     starting_capital = 18000  # user-defined base capital
 
     # Add Compound Annual Return (CAR) calculation
     if "OpenDate" in df.columns:
-        df["OpenDate"] = pd.to_datetime(df["OpenDate"], errors="coerce")
-        total_days = df["OpenDate"].dt.date.nunique()
-
-        if total_days > 0:
-            end_value = starting_capital + grouped["NetPnL"]
-            years = total_days / 252  # Approximate number of years
-            grouped["CAR"] = ((end_value / starting_capital) ** (1 / years) - 1) * 100
-            grouped["CAR"] = grouped["CAR"].round(2).astype(str) + "%"
+        trading_days = df["OpenDate"].dt.normalize()
+        leading_keys = keys[:-1]
+        if leading_keys:
+            days = trading_days.groupby([df[key] for key in leading_keys]).nunique().rename("TradingDays")
+            total_days = grouped[leading_keys].join(days, on=leading_keys)["TradingDays"]
         else:
-            grouped["CAR"] = "N/A"
+            total_days = pd.Series(trading_days.nunique(), index=grouped.index)
+
+        end_value = starting_capital + grouped["NetPnL"]
+        years = total_days / 252  # Approximate number of years
+        car = ((end_value / starting_capital) ** (1 / years) - 1) * 100
+        grouped["CAR"] = car.where(total_days > 0).round(2)
     else:
-        grouped["CAR"] = "N/A"
-
-    # Max Drawdown calculation per OpenTime group (improved version)
-    def compute_max_drawdown(pnls, starting_capital):
-        equity_curve = pnls.cumsum() + starting_capital
-        running_max = equity_curve.cummax()
-        drawdowns = (equity_curve - running_max) / running_max
-        return round(drawdowns.min() * 100, 2)
-
-    max_drawdowns = []
-    for time in grouped["OpenTime"]:
-        pnl_series = df[df["OpenTime"] == time]["NetPnL"]
-        if not pnl_series.empty:
-            max_dd = compute_max_drawdown(pnl_series.reset_index(drop=True), starting_capital)
-            max_drawdowns.append(f"{max_dd}%")
-        else:
-            max_drawdowns.append("N/A")
+        grouped["CAR"] = np.nan
 
-    grouped["MaxDrawdown"] = max_drawdowns
+    # Max Drawdown calculation per group
+    # Group numbers follow the same order as the rows of `grouped` (-1 = missing key)
+    codes = gb.ngroup().to_numpy()
+    traded = codes >= 0
+    grouped["MaxDrawdown"] = compute_max_drawdowns(
+        codes[traded], df["NetPnL"].to_numpy(dtype=np.float64)[traded], starting_capital
+    )
 
     # --- CALMAR ratio calculation ---
-    def parse_drawdown(value):
-        try:
-            return abs(float(value.strip('%')))
-        except:
-            return None
-
-    calmar_ratios = []
-    for car_str, dd_str in zip(grouped["CAR"], grouped["MaxDrawdown"]):
-        try:
-            car = float(car_str.strip('%'))
-            dd = parse_drawdown(dd_str)
-            if dd and dd != 0:
-                calmar = round(car / dd, 2)
-                calmar_ratios.append(calmar)
-            else:
-                calmar_ratios.append("N/A")
-        except:
-            calmar_ratios.append("N/A")
-
-    grouped["Calmar"] = calmar_ratios
+    # Undefined (NaN) when there is no drawdown or no CAR
+    abs_drawdown = grouped["MaxDrawdown"].abs()
+    calmar = np.where(abs_drawdown > 0, grouped["CAR"] / abs_drawdown, np.nan)
+    # Python's round() on plain floats, as the report always used; np.round differs on .xx5 values
+    grouped["Calmar"] = [round(float(ratio), 2) for ratio in calmar]
     return grouped
 
 def summarize_pnl_by_opentime_for_weekday(df: pd.DataFrame, target_weekday: str) -> pd.DataFrame:
@@ -120,7 +201,7 @@ def summarize_pnl_by_opentime_for_weekday(df: pd.DataFrame, target_weekday: str)
     for a specific weekday.
 
     Args:
-        df (pd.DataFrame): DataFrame containing trading data
+        df (pd.DataFrame): Trades already parsed by prepare_trades()
         target_weekday (str): Weekday for analysis. Options:
                             - 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday'
                             - number 0-6 (0=Monday, 6=Sunday)
@@ -128,11 +209,6 @@ def summarize_pnl_by_opentime_for_weekday(df: pd.DataFrame, target_weekday: str)
     Returns:
         pd.DataFrame: Summary table with open times and metrics for the given day.
     """
-    import pandas as pd
-    import pytz
-
-    df = df.copy()
-    
     # Mapping for different weekday input formats
     weekday_mapping = {
         'monday': 0,
@@ -156,126 +232,29 @@ def summarize_pnl_by_opentime_for_weekday(df: pd.DataFrame, target_weekday: str)
         if target_weekday_num < 0 or target_weekday_num > 6:
             raise ValueError("Weekday number must be between 0-6 (0=Monday, 6=Sunday)")
     
-    # Convert columns to proper data types
-    df["OpenDate"] = pd.to_datetime(df["OpenDate"], errors="coerce")
-    df["OpenTime"] = pd.to_datetime(df["OpenTime"], format="%H:%M:%S", errors="coerce").dt.time
-    df["ProfitLossAfterSlippage"] = pd.to_numeric(df["ProfitLossAfterSlippage"], errors="coerce")
-    df["CommissionFees"] = pd.to_numeric(df["CommissionFees"], errors="coerce")
-    df["NetPnL"] = df["ProfitLossAfterSlippage"] * 100 - df["CommissionFees"]
-    
-    # Convert IsWin to boolean
-    df["IsWin"] = df["IsWin"].astype(str).str.lower().map({"true": True, "false": False})
-    
-    # Filter by weekday
-    df["WeekdayNum"] = df["OpenDate"].dt.dayofweek
-    df_filtered = df[df["WeekdayNum"] == target_weekday_num].copy()
-    
+    return summarize_for_weekday(df, target_weekday_num)
+
+
+def summarize_for_weekday(df: pd.DataFrame, weekday_num: int) -> pd.DataFrame:
+    """
+    Filters prepared trades to one weekday and aggregates them by open time.
+
+    Args:
+        df (pd.DataFrame): Trades already parsed by prepare_trades()
+        weekday_num (int): Weekday number 0-6 (0=Monday, 6=Sunday)
+
+    Returns:
+        pd.DataFrame: Summary table with open times and metrics for the given day,
+                      or an empty DataFrame if there are no trades on that day.
+    """
+    if "WeekdayNum" not in df.columns:
+        raise ValueError("OpenDate column is required for the weekday analysis")
+
+    df_filtered = df[df["WeekdayNum"] == weekday_num]
     if df_filtered.empty:
-        weekday_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         return pd.DataFrame()
-    
-    # --- CET Conversion ---
-    def convert_to_cet(time_str):
-        try:
-            naive_dt = pd.to_datetime(f"2000-01-01 {time_str}")
-            eastern = pytz.timezone("US/Eastern")
-            cet = pytz.timezone("Europe/Prague")
-            localized = eastern.localize(naive_dt)
-            return localized.astimezone(cet).strftime("%H:%M:%S")
-        except:
-            return None
-    
-    # Create CET column
-    open_time_strs = df_filtered["OpenTime"].astype(str)
-    df_filtered["OpenTimeCET"] = open_time_strs.apply(convert_to_cet)
-    
-    # Group by open time
-    grouped = df_filtered.groupby("OpenTime").agg(
-        NetPnL=("NetPnL", "sum"),
-        Trades=("OpenTime", "count"),
-        Wins=("IsWin", "sum"),
-        Losses=("IsWin", lambda x: (~x).sum())
-    ).reset_index()
-    
-    # Calculate win rate
-    grouped["WinRate"] = ((grouped["Wins"] / grouped["Trades"] * 100).round(2)).astype(str) + "%"
-    
-    # Add CET column
-    grouped = grouped.merge(
-        df_filtered[["OpenTime", "OpenTimeCET"]].drop_duplicates(), 
-        on="OpenTime", 
-        how="left"
-    )
-    
-    # Reorder columns
-    cols = list(grouped.columns)
-    if "OpenTime" in cols and "OpenTimeCET" in cols:
-        cols.insert(cols.index("OpenTime") + 1, cols.pop(cols.index("OpenTimeCET")))
-        grouped = grouped[cols]
-    
-    # Define starting capital
-    starting_capital = 18000
-    
-    # Calculate CAR (Compound Annual Return)
-    total_days = df_filtered["OpenDate"].dt.date.nunique()
-    if total_days > 0:
-        years = total_days / 252  # Approximate number of trading days per year
-        end_value = starting_capital + grouped["NetPnL"]
-        grouped["CAR"] = ((end_value / starting_capital) ** (1 / years) - 1) * 100
-        grouped["CAR"] = grouped["CAR"].round(2).astype(str) + "%"
-    else:
-        grouped["CAR"] = "N/A"
-    
-    # Calculate maximum drawdown
-    def compute_max_drawdown(pnls, starting_capital):
-        if pnls.empty:
-            return 0
-        equity_curve = pnls.cumsum() + starting_capital
-        running_max = equity_curve.cummax()
-        drawdowns = (equity_curve - running_max) / running_max
-        return round(drawdowns.min() * 100, 2)
-    
-    max_drawdowns = []
-    for time in grouped["OpenTime"]:
-        pnl_series = df_filtered[df_filtered["OpenTime"] == time]["NetPnL"]
-        if not pnl_series.empty:
-            max_dd = compute_max_drawdown(pnl_series.reset_index(drop=True), starting_capital)
-            max_drawdowns.append(f"{max_dd}%")
-        else:
-            max_drawdowns.append("N/A")
-    
-    grouped["MaxDrawdown"] = max_drawdowns
-    
-    # Calculate CALMAR ratio
-    def parse_drawdown(value):
-        try:
-            return abs(float(value.strip('%')))
-        except:
-            return None
-    
-    calmar_ratios = []
-    for car_str, dd_str in zip(grouped["CAR"], grouped["MaxDrawdown"]):
-        try:
-            car = float(car_str.strip('%'))
-            dd = parse_drawdown(dd_str)
-            if dd and dd != 0:
-                calmar = round(car / dd, 2)
-                calmar_ratios.append(calmar)
-            else:
-                calmar_ratios.append("N/A")
-        except:
-            calmar_ratios.append("N/A")
-    
-    grouped["Calmar"] = calmar_ratios
-    
-    # Sort by time
-    grouped = grouped.sort_values("OpenTime")
-    
-    # Add information about analyzed day
-    weekday_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    analyzed_day = weekday_names[target_weekday_num]
-    
-    return grouped
+
+    return summarize_pnl_by_opentime(df_filtered)
 
 
 def analyze_all_weekdays(df: pd.DataFrame) -> pd.DataFrame:
@@ -285,43 +264,20 @@ def analyze_all_weekdays(df: pd.DataFrame) -> pd.DataFrame:
     Returns:
         pd.DataFrame: Combined DataFrame with results for all weekdays
     """
-    import pandas as pd
+    # prepare_trades() only derives WeekdayNum when the export has an OpenDate column
+    if "WeekdayNum" not in df.columns:
+        raise ValueError("OpenDate column is required for the weekday analysis")
     
-    weekdays = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
     weekday_names = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
     
-    all_results = []
-    
-    for i, day in enumerate(weekdays):
-        # Temporarily suppress output from main function
-        import sys
-        from io import StringIO
-        
-        old_stdout = sys.stdout
-        sys.stdout = StringIO()
-        
-        try:
-            result = summarize_pnl_by_opentime_for_weekday(df, day)
-            if not result.empty:
-                # Add weekday column
-                result = result.copy()
-                result['Weekday'] = weekday_names[i]
-                result['WeekdayNum'] = i
-                all_results.append(result)
-        finally:
-            sys.stdout = old_stdout
-    
-    if not all_results:
+    # One groupby over (WeekdayNum, OpenTimeSec) covers every weekday; rows come out
+    # sorted by weekday and time
+    combined_df = _summarize_by(df, ["WeekdayNum", "OpenTimeSec"])
+    if combined_df.empty:
         return pd.DataFrame()
     
-    # Combine all results
-    combined_df = pd.concat(all_results, ignore_index=True)
-    
-    # Reorder columns so weekday is at the beginning
-    cols = ['Weekday', 'WeekdayNum'] + [col for col in combined_df.columns if col not in ['Weekday', 'WeekdayNum']]
-    combined_df = combined_df[cols]
-    
-    # Sort by weekday and time
-    combined_df = combined_df.sort_values(['WeekdayNum', 'OpenTime'])
+    # WeekdayNum is float when some OpenDates failed to parse
+    combined_df["WeekdayNum"] = combined_df["WeekdayNum"].astype(int)
+    combined_df.insert(0, "Weekday", combined_df["WeekdayNum"].map(dict(enumerate(weekday_names))))
     
-    return combined_df
\ No newline at end of file
+    return combined_df
@@ -1,44 +1,70 @@
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 from analysis import *
 
 DATA_DIR = "data"
 OUTPUT_DIR = "output"
 
+# Frames derived from one another share memory until one of them is modified
+pd.set_option("mode.copy_on_write", True)
+
+def process_file(filepath):
+    """
+    Loads one CSV export and builds its summary and per-weekday summary.
+
+    A failing weekday pass does not cost the file its summary: it comes back as
+    (summary, None, error message) instead.
+    """
+    # Column types are inferred; prepare_trades() coerces whatever does not parse
+    df = prepare_trades(pd.read_csv(filepath))
+    summary = summarize_pnl_by_opentime(df)
+    try:
+        return summary, analyze_all_weekdays(df), None
+    except Exception as e:
+        return summary, None, str(e)
+
+def write_summaries(output_excel, summaries):
+    """Writes one sheet per summary into an Excel workbook."""
+    # Our cells never hold URLs or formulas, so skip xlsxwriter's per-string checks.
+    # (constant_memory is not usable: pandas writes cells column by column.)
+    options = {"strings_to_urls": False, "strings_to_formulas": False}
+    with pd.ExcelWriter(output_excel, engine="xlsxwriter", engine_kwargs={"options": options}) as writer:
+        for sheet, data in summaries.items():
+            format_summary(data).to_excel(writer, sheet_name=sheet[:31], index=False)  # Excel sheet names max 31 chars
+
+    print(f"Summary saved to {output_excel}")
+
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
     all_summaries = {}
     all_summaries_days = {}
 
-    for filename in os.listdir(DATA_DIR):
-        if filename.endswith(".csv"):
-            filepath = os.path.join(DATA_DIR, filename)
-            print(f"🔍 Loading file: {filename}")
+    # Files are independent, so process them in parallel; Excel writing stays serial
+    with ProcessPoolExecutor() as executor:
+        futures = {}
+        for filename in os.listdir(DATA_DIR):
+            if filename.endswith(".csv"):
+                filepath = os.path.join(DATA_DIR, filename)
+                print(f"🔍 Loading file: {filename}")
+                futures[filename] = executor.submit(process_file, filepath)
+
+        # Collect in submission order so the sheet order stays deterministic
+        for filename, future in futures.items():
             try:
-                df = pd.read_csv(filepath)
-                summary = summarize_pnl_by_opentime(df)
+                summary, summary_days, days_error = future.result()
                 sheet_name = os.path.splitext(filename)[0]
                 all_summaries[sheet_name] = summary
-                summary_days = analyze_all_weekdays(df)
-                sheet_name = os.path.splitext(filename)[0]
-                all_summaries_days[sheet_name] = summary_days
+                if days_error is not None:
+                    print(f"❌ Error during processing {filename}: {days_error}")
+                else:
+                    all_summaries_days[sheet_name] = summary_days
             except Exception as e:
                 print(f"❌ Error during processing {filename}: {e}")
 
-    output_excel = os.path.join(OUTPUT_DIR, "summary_all.xlsx")
-    with pd.ExcelWriter(output_excel, engine="xlsxwriter") as writer:
-        for sheet, data in all_summaries.items():
-            data.to_excel(writer, sheet_name=sheet[:31], index=False)  # Excel sheet names max 31 chars
-
-    print(f"Summary saved to {output_excel}")
-
-    output_excel = os.path.join(OUTPUT_DIR, "summary_all_days.xlsx")
-    with pd.ExcelWriter(output_excel, engine="xlsxwriter") as writer:
-        for sheet, data in all_summaries_days.items():
-            data.to_excel(writer, sheet_name=sheet[:31], index=False)  # Excel sheet names max 31 chars
-
-    print(f"Summary saved to {output_excel}")
+    write_summaries(os.path.join(OUTPUT_DIR, "summary_all.xlsx"), all_summaries)
+    write_summaries(os.path.join(OUTPUT_DIR, "summary_all_days.xlsx"), all_summaries_days)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file